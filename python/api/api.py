@@ -1,10 +1,38 @@
 # bff_api.py
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Body
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import iris
+import asyncio
+import numpy as np
 import datetime
-from collections import Counter
+import functools
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# formatos aceitos em parse_date, na ordem em que são testados: (regex, posição de ano/mês/dia)
+_DATE_PATTERNS = (
+    (re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})"), (0, 1, 2)),  # %Y-%m-%d
+    (re.compile(r"(\d{4})/(\d{1,2})/(\d{1,2})"), (0, 1, 2)),  # %Y/%m/%d
+    (re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})"), (2, 0, 1)),  # %m/%d/%Y
+)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_date_str(val: str):
+    for pattern, (y, m, d) in _DATE_PATTERNS:
+        match = pattern.fullmatch(val)
+        if not match:
+            continue
+        parts = match.groups()
+        try:
+            return datetime.datetime(int(parts[y]), int(parts[m]), int(parts[d]))
+        except ValueError:
+            continue
+    # se não der certo, retorna None
+    return None
 
 def parse_date(val):
     """Converte valores de data em datetime.datetime"""
@@ -17,14 +45,7 @@ def parse_date(val):
     if isinstance(val, (int, float)):
         return datetime.datetime.fromtimestamp(val)
     if isinstance(val, str):
-        # tenta vários formatos comuns
-        for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y"):
-            try:
-                return datetime.datetime.strptime(val, fmt)
-            except:
-                continue
-        # se não der certo, retorna None
-        return None
+        return _parse_date_str(val)
     return None
 
 # === IRIS CONNECTION ===
@@ -32,15 +53,84 @@ class IRISConnection:
     def __init__(self, host="sanitary-surveillance", port=1972, namespace="USER", username="_SYSTEM", password="SYS"):
         self.conn = iris.connect(hostname=host, port=port, namespace=namespace, username=username, password=password)
 
-    def query(self, sql: str, params: list = []):
+    def query_raw(self, sql: str, params: list = []):
+        """Retorna (colunas, linhas) sem converter cada linha em dict."""
         cursor = self.conn.cursor()
         cursor.execute(sql, params)
         rows = cursor.fetchall()
-        columns = [col[0] for col in cursor.description] if rows else []
+        columns = tuple(col[0] for col in cursor.description) if rows else ()
         cursor.close()
-        return [dict(zip(columns, row)) for row in rows] if rows else []
+        return columns, rows
+
+    def query(self, sql: str, params: list = []):
+        columns, rows = self.query_raw(sql, params)
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+# === CONNECTION POOL ===
+POOL_SIZE = 10
+PING_INTERVAL = 30  # segundos sem uso antes de validar a conexão
+
+class IRISConnectionPool:
+    """Pool de conexões persistentes com o IRIS, compartilhado pelo processo.
+
+    As conexões são abertas sob demanda no primeiro acquire de cada vaga, então a API sobe
+    mesmo se o IRIS ainda não estiver aceitando conexões.
+    """
+    def __init__(self, size: int = POOL_SIZE, **conn_args):
+        self.conn_args = conn_args
+        self.idle = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self.idle.put((None, 0.0))
+
+    def _ensure_alive(self, conn: Optional[IRISConnection], last_used: float) -> IRISConnection:
+        if conn is None:
+            return IRISConnection(**self.conn_args)
+        if time.monotonic() - last_used < PING_INTERVAL:
+            return conn
+        try:
+            conn.query("SELECT 1")
+            return conn
+        except Exception:
+            conn.close()
+            return IRISConnection(**self.conn_args)
+
+    @contextmanager
+    def acquire(self):
+        conn, last_used = self.idle.get()
+        try:
+            conn = self._ensure_alive(conn, last_used)
+        except Exception:
+            # (re)conexão falhou: devolve a vaga vazia para não encolher o pool
+            self.idle.put((None, 0.0))
+            raise
+        ok = False
+        try:
+            yield conn
+            ok = True
+        finally:
+            # após um erro a conexão pode estar quebrada: last_used=0 força o ping no próximo acquire
+            self.idle.put((conn, time.monotonic() if ok else 0.0))
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not None:
+                conn.close()
 
 # === MODELS ===
+# colunas de cpsc_data usadas por RecallOut (evita trafegar description, remedy etc.)
+RECALL_COLUMNS = ("recall_number", "name_of_product", "recall_date", "source",
+                  "hazard_description", "consumer_action", "units")
+
 class RecallOut(BaseModel):
     recall_number: str
     name_of_product: str = None
@@ -60,6 +150,7 @@ class InsightSummary(BaseModel):
     avg_units: int
     top_manufacturers: Dict[str,int]
     top_sellers: Dict[str,int]
+    countries_affected: int = 0
 
 class InsightCounter(BaseModel):
     name: str
@@ -67,158 +158,203 @@ class InsightCounter(BaseModel):
 
 # === FASTAPI ===
 app = FastAPI(title="CPSC BFF API")
+pool: Optional[IRISConnectionPool] = None
+# uma thread por conexão do pool: o driver iris é bloqueante
+db_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="iris")
+
+@app.on_event("startup")
+def open_pool():
+    global pool
+    pool = IRISConnectionPool()
+
+@app.on_event("shutdown")
+def close_pool():
+    db_executor.shutdown(wait=True)
+    if pool is not None:
+        pool.close()
 
 # === UTILITIES ===
-def get_auxiliary(conn, table_name: str, recall_number: str):
-    sql = f"SELECT * FROM {table_name} WHERE recall_number = ?"
-    rows = conn.query(sql, [recall_number])
-    return [r[list(r.keys())[1]] for r in rows] if rows else []
+def _pooled_query(sql: str, params: list, raw: bool = False):
+    with pool.acquire() as conn:
+        return conn.query_raw(sql, params) if raw else conn.query(sql, params)
 
-# === ROUTES ===
-@app.get("/recalls/", response_model=List[RecallOut])
-def list_recalls(page: int = Query(1, ge=1), page_size: int = Query(50, ge=1, le=500),
-                 manufacturer: str = None, country: str = None, source: str = None):
-    conn = IRISConnection()
-    sql = "SELECT * FROM cpsc_data ORDER BY recall_date DESC"
-    all_records = conn.query(sql)
-    if not all_records:
-        raise HTTPException(status_code=404, detail="No recalls found")
-
-    # Filtering
-    filtered = []
-    for rec in all_records:
+async def run_query(sql: str, params: list = []):
+    """Executa a consulta no db_executor sem bloquear o event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, _pooled_query, sql, params)
+
+async def run_query_raw(sql: str, params: list = []):
+    """Como run_query, mas retorna (colunas, linhas) com as linhas em tuplas."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, _pooled_query, sql, params, True)
+
+AUX_BATCH_SIZE = 500  # limite de parâmetros por cláusula IN
+
+async def get_auxiliary_map(table_name: str, recall_numbers: list) -> Dict[str, List[str]]:
+    """Busca os valores auxiliares de vários recalls de uma vez: recall_number -> lista de valores."""
+    batches = [recall_numbers[i:i + AUX_BATCH_SIZE] for i in range(0, len(recall_numbers), AUX_BATCH_SIZE)]
+    results = await asyncio.gather(*[
+        run_query_raw(f"SELECT recall_number, value FROM {table_name} WHERE recall_number IN ({', '.join(['?'] * len(b))})", b)
+        for b in batches
+    ])
+    aux_map = {}
+    for _, rows in results:
+        for rn, value in rows:
+            aux_map.setdefault(rn, []).append(value)
+    return aux_map
+
+async def count_by(table_name: str, column: str = "value", limit: int = None, where: str = "") -> List[Dict[str, Any]]:
+    """Histograma `column` -> quantidade calculado no IRIS, do mais frequente ao menos frequente."""
+    top = f"TOP {int(limit)} " if limit else ""
+    sql = (f"SELECT {top}%EXACT({column}) AS name, COUNT(*) AS c FROM {table_name} {where} "
+           f"GROUP BY %EXACT({column}) ORDER BY c DESC")
+    _, rows = await run_query_raw(sql)
+    return [{"name": name, "count": c} for name, c in rows]
+
+async def attach_auxiliary(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Preenche listas auxiliares, data e unidades dos registros de cpsc_data, com uma consulta por tabela."""
+    recall_numbers = list({rec['recall_number'] for rec in records if rec['recall_number']})
+    manufacturers_map, sold_at_map, country_map, remedy_map = await asyncio.gather(
+        get_auxiliary_map("cpsc_manufacturers", recall_numbers),
+        get_auxiliary_map("cpsc_sold_at", recall_numbers),
+        get_auxiliary_map("cpsc_manufactured_in", recall_numbers),
+        get_auxiliary_map("cpsc_remedy_type", recall_numbers),
+    )
+
+    for rec in records:
         rn = rec['recall_number']
-        rec['manufacturers'] = get_auxiliary(conn, "cpsc_manufacturers", rn)
-        rec['sold_at'] = get_auxiliary(conn, "cpsc_sold_at", rn)
-        rec['country'] = get_auxiliary(conn, "cpsc_manufactured_in", rn)
-        rec['remedy_type'] = get_auxiliary(conn, "cpsc_remedy_type", rn)
+        rec['manufacturers'] = manufacturers_map.get(rn, [])
+        rec['sold_at'] = sold_at_map.get(rn, [])
+        rec['country'] = country_map.get(rn, [])
+        rec['remedy_type'] = remedy_map.get(rn, [])
         rec['recall_date'] = parse_date(rec.get('recall_date'))
         rec['units'] = rec.get('units') or 0
+    return records
 
-        if manufacturer and manufacturer not in rec['manufacturers']:
-            continue
-        if country and country not in rec['country']:
-            continue
-        if source and source != rec.get('source'):
-            continue
-        filtered.append(rec)
+# === INSIGHTS CACHE ===
+INSIGHTS_TTL = 3600  # o scraper atualiza os dados uma vez por dia
+_insights_cache: Dict[str, tuple] = {}
+
+def cached(ttl: int = INSIGHTS_TTL):
+    """Memoriza o resultado de uma rota sem parâmetros por `ttl` segundos."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper():
+            hit = _insights_cache.get(func.__name__)
+            if hit and hit[1] > time.monotonic():
+                return hit[0]
+            value = await func()
+            _insights_cache[func.__name__] = (value, time.monotonic() + ttl)
+            return value
+        return wrapper
+    return decorator
+
+# === ROUTES ===
+@app.get("/recalls/", response_model=List[RecallOut])
+async def list_recalls(page: int = Query(1, ge=1), page_size: int = Query(50, ge=1, le=500),
+                       manufacturer: str = None, country: str = None, source: str = None):
+    # Filtros e paginação executados no próprio IRIS; %EXACT mantém a comparação exata
+    # (a colação padrão SQLUPPER ignoraria maiúsculas e espaços finais)
+    where, params = [], []
+    if source:
+        where.append("%EXACT(d.source) = ?")
+        params.append(source)
+    if manufacturer:
+        where.append("EXISTS (SELECT 1 FROM cpsc_manufacturers m WHERE m.recall_number = d.recall_number AND %EXACT(m.value) = ?)")
+        params.append(manufacturer)
+    if country:
+        where.append("EXISTS (SELECT 1 FROM cpsc_manufactured_in c WHERE c.recall_number = d.recall_number AND %EXACT(c.value) = ?)")
+        params.append(country)
+    where_sql = f"WHERE {' AND '.join(where)} " if where else ""
+    columns = ", ".join(f"d.{c}" for c in RECALL_COLUMNS)
+    sql = f"SELECT {columns} FROM cpsc_data d {where_sql}ORDER BY d.recall_date DESC, d.id DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+    page_records = await run_query(sql, params + [(page - 1) * page_size, page_size])
+    if not page_records:
+        if page == 1 and not where:
+            raise HTTPException(status_code=404, detail="No recalls found")
+        return []
+
+    # Tabelas auxiliares em lote, restritas aos recalls da página
+    return await attach_auxiliary(page_records)
 
-    skip = (page - 1) * page_size
-    return filtered[skip:skip+page_size]
+@app.post("/recalls/batch", response_model=Dict[str, RecallOut])
+async def recalls_batch(recall_numbers: List[str] = Body(..., max_length=AUX_BATCH_SIZE)):
+    """Detalhes de vários recalls em uma requisição: recall_number -> recall (ausentes são omitidos)."""
+    recall_numbers = list(dict.fromkeys(rn for rn in recall_numbers if rn))
+    if not recall_numbers:
+        return {}
+    placeholders = ', '.join(['?'] * len(recall_numbers))
+    sql = f"SELECT {', '.join(RECALL_COLUMNS)} FROM cpsc_data WHERE recall_number IN ({placeholders})"
+    records = await attach_auxiliary(await run_query(sql, recall_numbers))
+    return {rec['recall_number']: rec for rec in records}
 
 @app.get("/recalls/{recall_number}", response_model=RecallOut)
-def recall_detail(recall_number: str):
-    conn = IRISConnection()
-    sql = "SELECT * FROM cpsc_data WHERE recall_number = ?"
-    results = conn.query(sql, [recall_number])
+async def recall_detail(recall_number: str):
+    sql = f"SELECT {', '.join(RECALL_COLUMNS)} FROM cpsc_data WHERE recall_number = ?"
+    results = await run_query(sql, [recall_number])
     if not results:
         raise HTTPException(status_code=404, detail=f"Recall {recall_number} not found")
-    rec = results[0]
 
     # Preencher campos relacionados
-    rec['manufacturers'] = get_auxiliary(conn, "cpsc_manufacturers", recall_number)
-    rec['sold_at'] = get_auxiliary(conn, "cpsc_sold_at", recall_number)
-    rec['country'] = get_auxiliary(conn, "cpsc_manufactured_in", recall_number)
-    rec['remedy_type'] = get_auxiliary(conn, "cpsc_remedy_type", recall_number)
-    rec['recall_date'] = parse_date(rec.get('recall_date'))
-    rec['units'] = rec.get('units') or 0
-
+    rec, = await attach_auxiliary(results[:1])
     return rec
 
 @app.get("/insights/summary", response_model=InsightSummary)
-def get_summary():
-    conn = IRISConnection()
-    
+@cached()
+async def get_summary():
     # 1. Buscar dados principais
-    data = conn.query("SELECT recall_number, units FROM cpsc_data")
-    if not data:
+    _, rows = await run_query_raw("SELECT units FROM cpsc_data")
+    if not rows:
         raise HTTPException(status_code=404, detail="No data")
 
-    total_recalls = len(data)
-    units_list = [d['units'] or 0 for d in data]
-    valid_units = [u for u in units_list if u]
-    avg_units = int(sum(valid_units) / len(valid_units)) if valid_units else 0
-
-    # 2. Buscar todas as tabelas auxiliares de uma vez
-    manufacturers_data = conn.query("SELECT recall_number, value FROM SQLUser.cpsc_manufacturers")
-    sellers_data = conn.query("SELECT recall_number, value FROM SQLUser.cpsc_sold_at")
-    countries_data = conn.query("SELECT recall_number, value FROM SQLUser.cpsc_manufactured_in")
-
-    # 3. Criar dicionário recall_number -> lista de valores
-    manufacturers_map = {}
-    for r in manufacturers_data:
-        manufacturers_map.setdefault(r['recall_number'], []).append(r['value'])
-
-    sellers_map = {}
-    for r in sellers_data:
-        sellers_map.setdefault(r['recall_number'], []).append(r['value'])
-
-    countries_map = {}
-    for r in countries_data:
-        countries_map.setdefault(r['recall_number'], []).append(r['value'])
-
-    # 4. Construir contadores
-    top_manufacturers = Counter()
-    top_sellers = Counter()
-    country_counter = Counter()
-    for rec in data:
-        rn = rec['recall_number']
-        top_manufacturers.update(manufacturers_map.get(rn, []))
-        top_sellers.update(sellers_map.get(rn, []))
-        country_counter.update(countries_map.get(rn, []))
+    total_recalls = len(rows)
+    units = np.fromiter((r[0] or 0 for r in rows), dtype=np.int64, count=total_recalls)
+    valid_units = units[units != 0]
+    avg_units = int(valid_units.mean()) if valid_units.size else 0
+
+    # 2. Contagens por valor no IRIS, apenas para recalls presentes em cpsc_data
+    known = "WHERE recall_number IN (SELECT recall_number FROM cpsc_data)"
+    top_manufacturers, top_sellers, (_, countries) = await asyncio.gather(
+        count_by("SQLUser.cpsc_manufacturers", limit=10, where=known),
+        count_by("SQLUser.cpsc_sold_at", limit=10, where=known),
+        run_query_raw(f"SELECT COUNT(DISTINCT %EXACT(value)) FROM SQLUser.cpsc_manufactured_in {known}"),
+    )
 
-    countries_affected = len(country_counter)  # simplificado
+    countries_affected = countries[0][0] if countries else 0
 
     return {
         "total_recalls": total_recalls,
         "avg_units": avg_units,
-        "top_manufacturers": dict(top_manufacturers.most_common(10)),
-        "top_sellers": dict(top_sellers.most_common(10)),
+        "top_manufacturers": {r["name"]: r["count"] for r in top_manufacturers},
+        "top_sellers": {r["name"]: r["count"] for r in top_sellers},
         "countries_affected": countries_affected
     }
 
 
 @app.get("/insights/by_month", response_model=List[InsightCounter])
-def by_month():
-    conn = IRISConnection()
-    data = conn.query("SELECT recall_date FROM cpsc_data WHERE recall_date IS NOT NULL")
-    month_counter = Counter()
-    for rec in data:
-        dt = rec['recall_date']
-        if isinstance(dt, (int, float)):
-            dt = datetime.datetime.fromtimestamp(dt)
-        elif isinstance(dt, datetime.date):
-            dt = datetime.datetime(dt.year, dt.month, dt.day)
-        month_counter[dt.strftime("%Y-%m")] += 1
-    return [{"name": m, "count": c} for m, c in sorted(month_counter.items())]
+@cached()
+async def by_month():
+    _, rows = await run_query_raw(
+        "SELECT TO_CHAR(recall_date, 'YYYY-MM') AS name, COUNT(*) AS c FROM cpsc_data "
+        "WHERE recall_date IS NOT NULL GROUP BY TO_CHAR(recall_date, 'YYYY-MM') ORDER BY name"
+    )
+    return [{"name": name, "count": c} for name, c in rows]
 
 
 @app.get("/insights/by_country", response_model=List[InsightCounter])
-def by_country():
-    conn = IRISConnection()
-    data = conn.query("SELECT * FROM cpsc_manufactured_in")
-    country_counter = Counter()
-    for rec in data:
-        country_counter.update([rec[list(rec.keys())[1]]])
-    return [{"name": c, "count": n} for c, n in country_counter.most_common()]
+@cached()
+async def by_country():
+    return await count_by("cpsc_manufactured_in")
 
 @app.get("/insights/by_remedy_type", response_model=List[InsightCounter])
-def by_remedy():
-    conn = IRISConnection()
-    data = conn.query("SELECT * FROM cpsc_remedy_type")
-    counter = Counter()
-    for rec in data:
-        counter.update([rec[list(rec.keys())[1]]])
-    return [{"name": r, "count": n} for r, n in counter.most_common()]
+@cached()
+async def by_remedy():
+    return await count_by("cpsc_remedy_type")
 
 @app.get("/insights/by_hazard", response_model=List[InsightCounter])
-def by_hazard():
-    conn = IRISConnection()
-    data = conn.query("SELECT hazard_description FROM cpsc_data WHERE hazard_description IS NOT NULL")
-    counter = Counter()
-    for rec in data:
-        counter.update([rec['hazard_description']])
-    return [{"name": h, "count": n} for h, n in counter.most_common()]
+@cached()
+async def by_hazard():
+    return await count_by("cpsc_data", "hazard_description", where="WHERE hazard_description IS NOT NULL")
 
 # === RUN SERVER ===
 if __name__ == "__main__":
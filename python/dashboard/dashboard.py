@@ -2,56 +2,88 @@
 import streamlit as st
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import altair as alt
 import pydeck as pdk
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache
 from datetime import datetime, timedelta
 
 API_URL = "http://myapp-api:8000"  # adjust if needed
 
+# Typical pattern observed: 2-3 digits dash 3 digits (example: 25-479 or 96-125) - be permissive
+_RECALL_ID_RE = re.compile(r"^(?:\d{1,3}[-/]\d{2,4}|\d{2,4})$")
+
 st.set_page_config(page_title="CPSC Recalls Dashboard", layout="wide", initial_sidebar_state="expanded")
 
 # ---------------------------
 # Helpers
 # ---------------------------
-def safe_get_json(path: str, params: dict = None, timeout: int = 10) -> Any:
+@st.cache_resource
+def get_session() -> requests.Session:
+    """Keep-alive session shared by all API calls; the pool covers every fetch worker at once."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=64)
+def get_json(url: str, params: dict, timeout: int) -> Any:
+    """Cached GET; failures raise, so they are never cached."""
+    r = get_session().get(url, params=params, timeout=timeout)
+    r.raise_for_status()
+    return r.json()
+
+def fetch_json(path: str, params: dict = None, timeout: int = 10) -> Tuple[Any, Optional[str]]:
+    """GET path on the API -> (json, None) or (None, error message). Safe to run in worker threads (no st.* calls)."""
     url = f"{API_URL.rstrip('/')}{path}"
     try:
-        r = requests.get(url, params=params or {}, timeout=timeout)
-        r.raise_for_status()
-        return r.json()
+        return get_json(url, params or {}, timeout), None
     except Exception as e:
-        st.error(f"Error fetching {url}: {e}")
-        return None
-
-@st.cache_data(ttl=300)
-def fetch_recall_detail(recall_number: str) -> Dict[str, Any]:
-    """Cached call to /recalls/{recall_number} to resolve names when top_* keys are recall ids."""
-    url = f"{API_URL}/recalls/{recall_number}"
-    try:
-        r = requests.get(url, timeout=6)
-        r.raise_for_status()
-        return r.json()
-    except Exception:
+        return None, f"Error fetching {url}: {e}"
+
+@st.cache_resource
+def get_fetch_executor() -> ThreadPoolExecutor:
+    """One pool per server process, shared by all sessions, for concurrent API calls."""
+    return ThreadPoolExecutor(max_workers=6, thread_name_prefix="api-fetch")
+
+def await_json(future: Future) -> Any:
+    """Wait for a fetch_json future on the script thread, showing its error (if any) in the page."""
+    data, error = future.result()
+    if error:
+        st.error(error)
+    return data
+
+@st.cache_data(ttl=300, max_entries=512, show_spinner=False)
+def fetch_recall_details(recall_numbers: Tuple[str, ...]) -> Dict[str, Dict[str, Any]]:
+    """Cached POST /recalls/batch: resolves every recall id used as a top_* key in one round trip.
+    Failures raise, so they are never cached."""
+    if not recall_numbers:
         return {}
+    r = get_session().post(f"{API_URL}/recalls/batch", json=list(recall_numbers), timeout=6)
+    r.raise_for_status()
+    return r.json()
 
 def looks_like_recall_id(s: str) -> bool:
     if not isinstance(s, str):
         return False
-    # Typical pattern observed: 2-3 digits dash 3 digits (example: 25-479 or 96-125) - be permissive
-    return bool(re.match(r"^\d{1,3}[-/]\d{2,4}$", s)) or bool(re.match(r"^\d{2,4}$", s))
+    # ids are at most 8 chars and start with a digit: rejects company names without touching the regex
+    if not s or len(s) > 8 or not s[0].isdigit():
+        return False
+    return bool(_RECALL_ID_RE.match(s))
 
-def resolve_label(key: str, kind: str = "manufacturer") -> str:
+def resolve_label(key: str, kind: str = "manufacturer", details: Dict[str, Dict[str, Any]] = None) -> str:
     """
-    If `key` looks like a recall_number, try to fetch the recall and return the first manufacturer / sold_at.
-    Otherwise return key unchanged.
+    If `key` looks like a recall_number, look the recall up in `details` (from fetch_recall_details)
+    and return the first manufacturer / sold_at. Otherwise return key unchanged.
     """
     if not key:
         return key
     if looks_like_recall_id(key):
-        detail = fetch_recall_detail(key)
+        detail = (details or {}).get(key) or {}
         if kind == "manufacturer":
             vals = detail.get("manufacturers") or detail.get("manufacturer") or []
             if isinstance(vals, list) and vals:
@@ -99,23 +131,72 @@ def to_readable_date(val) -> str:
         return val
     return str(val)
 
+def to_readable_dates(col: pd.Series) -> pd.Series:
+    """
+    Vectorized to_readable_date for a whole column.
+    Numeric columns are HOROLOG days; anything else is parsed with pd.to_datetime.
+    Values pandas can't parse fall back to the scalar to_readable_date.
+    """
+    if pd.api.types.is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+        dates = pd.Timestamp(1840, 12, 31) + pd.to_timedelta(col, unit="D")
+    else:
+        dates = pd.to_datetime(col, errors="coerce", format="mixed")
+    readable = dates.dt.strftime("%Y-%m-%d")
+    unparsed = readable.isna() & col.notna()
+    if unparsed.any():
+        readable = readable.mask(unparsed, col[unparsed].map(to_readable_date))
+    return readable.fillna("")
+
+def to_kv_df(obj: Any, key_name: str, val_name: str = "count") -> pd.DataFrame:
+    """
+    Normalize an insights payload into a two-column DataFrame [key_name, val_name].
+    Accepts a dict of key->count or a list of {"name": ..., "count": ...} records.
+    """
+    if isinstance(obj, dict) and obj:
+        return pd.DataFrame.from_dict(obj, orient="index", columns=[val_name]).rename_axis(key_name).reset_index()
+    if isinstance(obj, list) and obj:
+        return pd.DataFrame(obj).rename(columns={"name": key_name})
+    return pd.DataFrame(columns=[key_name, val_name])
+
+def chart_data(df: pd.DataFrame, label: str, value: str = "count", top_n: int = None, max_label: int = 80) -> pd.DataFrame:
+    """
+    Only the columns a chart encodes, top `top_n` rows by `value`, labels cut to `max_label` chars
+    and integer counts: Altair embeds the frame as JSON in the page, so this keeps the spec small.
+    """
+    out = df[[label, value]]
+    if top_n:
+        out = out.nlargest(top_n, value)
+    return out.assign(**{label: out[label].astype(str).str.slice(0, max_label), value: out[value].astype("int32")})
+
+def join_lists(col: pd.Series, sep: str = ", ") -> pd.Series:
+    """Join list cells with `sep` via the .str accessor; non-list cells are kept as-is (None -> "")."""
+    col = col.astype(object)
+    is_list = col.map(type).eq(list)
+    return col.where(is_list).str.join(sep).fillna(col.where(~is_list)).fillna("")
+
 # ---------------------------
-# Sidebar / Filters
+# Sidebar
 # ---------------------------
-st.sidebar.header("Filters")
-manufacturer_filter = st.sidebar.text_input("Manufacturer (partial)")
-country_filter = st.sidebar.text_input("Country (partial, ex: USA)")
-source_filter = st.sidebar.text_input("Source (partial, ex: recall/warning)")
-
-st.sidebar.markdown("---")
 st.sidebar.markdown("API base: " + API_URL)
 st.sidebar.caption("Data refreshed every 5 minutes (cached).")
 
+# ---------------------------
+# Fire all insights requests up-front; each section waits only for its own result
+# ---------------------------
+executor = get_fetch_executor()
+pending = {
+    "summary": executor.submit(fetch_json, "/insights/summary"),
+    "by_month": executor.submit(fetch_json, "/insights/by_month"),
+    "by_country": executor.submit(fetch_json, "/insights/by_country"),
+    "by_remedy_type": executor.submit(fetch_json, "/insights/by_remedy_type"),
+    "by_hazard": executor.submit(fetch_json, "/insights/by_hazard"),
+}
+
 # ---------------------------
 # Fetch summary (with spinner)
 # ---------------------------
 with st.spinner("Fetching summary..."):
-    summary = safe_get_json("/insights/summary")
+    summary = await_json(pending["summary"])
     # fallback structure if endpoint missing
     if not summary:
         summary = {}
@@ -150,18 +231,28 @@ st.subheader("Top Manufacturers & Sellers")
 top_man = summary.get("top_manufacturers") or {}
 top_sellers = summary.get("top_sellers") or {}
 
-def build_labelled_df(dct: Dict[str,int], kind: str="manufacturer", top_n: int=12) -> pd.DataFrame:
-    items = []
-    for k, v in dct.items():
-        label = resolve_label(k, "manufacturer" if kind=="manufacturer" else "seller")
-        items.append((label, int(v or 0)))
-    df = pd.DataFrame(items, columns=[ "Name", "Count"])
-    df = df.groupby("Name", as_index=False).sum().sort_values("Count", ascending=True).tail(top_n)
-    return df
+@st.cache_data(ttl=300, max_entries=8, show_spinner=False)
+def build_labelled_df(dct: Dict[str,int], kind: str="manufacturer", top_n: int=12,
+                      details: Dict[str, Dict[str, Any]] = None) -> pd.DataFrame:
+    if not dct:
+        return pd.DataFrame(columns=["Name", "Count"])
+    counts = pd.Series(dct, dtype="float64").fillna(0).astype("int64")
+    # only recall-id keys need resolving; every other key is its own label
+    label_kind = "manufacturer" if kind=="manufacturer" else "seller"
+    resolved = {k: resolve_label(k, label_kind, details) for k in counts.index if looks_like_recall_id(k)}
+    labels = counts.index.map(lambda k: resolved.get(k, k))
+    df = counts.groupby(labels).sum().sort_values().tail(top_n)
+    return df.rename_axis("Name").reset_index(name="Count")
 
 with st.spinner("Building manufacturer & seller charts..."):
-    df_man = build_labelled_df(top_man, kind="manufacturer", top_n=12)
-    df_sellers = build_labelled_df(top_sellers, kind="seller", top_n=12)
+    # all recall ids used as keys, from both charts, resolved in a single request
+    recall_ids = tuple(sorted({k for k in (*top_man, *top_sellers) if looks_like_recall_id(k)}))
+    try:
+        recall_details = fetch_recall_details(recall_ids)
+    except Exception:
+        recall_details = {}  # labels fall back to the raw ids until the next rerun
+    df_man = build_labelled_df(top_man, kind="manufacturer", top_n=12, details=recall_details)
+    df_sellers = build_labelled_df(top_sellers, kind="seller", top_n=12, details=recall_details)
 
 left_col, right_col = st.columns(2)
 with left_col:
@@ -169,7 +260,7 @@ with left_col:
     if df_man.empty:
         st.info("No manufacturer data available.")
     else:
-        chart_m = alt.Chart(df_man).mark_bar().encode(
+        chart_m = alt.Chart(chart_data(df_man, "Name", "Count")).mark_bar().encode(
             x=alt.X("Count:Q", title="Number of Recalls"),
             y=alt.Y("Name:N", sort='-x', title="Manufacturer")
         ).properties(height=420, width=700)
@@ -180,7 +271,7 @@ with right_col:
     if df_sellers.empty:
         st.info("No sellers data available.")
     else:
-        chart_s = alt.Chart(df_sellers).mark_bar(color="#ff7f0e").encode(
+        chart_s = alt.Chart(chart_data(df_sellers, "Name", "Count")).mark_bar(color="#ff7f0e").encode(
             x=alt.X("Count:Q", title="Number of Recalls"),
             y=alt.Y("Name:N", sort='-x', title="Seller")
         ).properties(height=420, width=700)
@@ -191,23 +282,15 @@ with right_col:
 # ---------------------------
 st.subheader("Recalls Over Time")
 with st.spinner("Loading recalls over time..."):
-    by_month = safe_get_json("/insights/by_month") or {}
+    by_month = await_json(pending["by_month"]) or {}
     # Expecting list/dict of month->count. Accept many shapes.
-    # If by_month is list of dicts -> normalize.
-    if isinstance(by_month, dict):
-        df_month = pd.DataFrame(list(by_month.items()), columns=["month", "count"])
-    elif isinstance(by_month, list):
-        df_month = pd.DataFrame(by_month)
-        if "name" in df_month.columns and "count" in df_month.columns:
-            df_month = df_month.rename(columns={"name":"month"})
-    else:
-        df_month = pd.DataFrame(columns=["month","count"])
+    df_month = to_kv_df(by_month, "month")
 
     if df_month.empty:
         st.info("No monthly data available.")
     else:
         df_month = df_month.sort_values("month")
-        chart_month = alt.Chart(df_month).mark_line(point=True).encode(
+        chart_month = alt.Chart(chart_data(df_month, "month")).mark_line(point=True).encode(
             x=alt.X("month:N", title="Month"),
             y=alt.Y("count:Q", title="Number of Recalls")
         ).properties(width=900, height=350)
@@ -218,107 +301,111 @@ with st.spinner("Loading recalls over time..."):
 # ---------------------------
 st.subheader("Recalls by Country")
 with st.spinner("Loading recalls by country..."):
-    by_country = safe_get_json("/insights/by_country") or {}
-    # Accept dict or list-of-dicts
-    if isinstance(by_country, dict):
-        df_country = pd.DataFrame(list(by_country.items()), columns=["country", "count"])
-    elif isinstance(by_country, list):
-        df_country = pd.DataFrame(by_country)
-        if "name" in df_country.columns and "count" in df_country.columns:
-            df_country = df_country.rename(columns={"name":"country"})
-    else:
-        df_country = pd.DataFrame(columns=["country","count"])
+    by_country = await_json(pending["by_country"]) or {}
+    df_country = to_kv_df(by_country, "country")
 
     if df_country.empty:
         st.info("No country data available.")
     else:
         df_country = df_country.sort_values("count", ascending=False).head(25)
-        st.bar_chart(df_country.set_index("country"))
+        chart_country = alt.Chart(chart_data(df_country, "country")).mark_bar().encode(
+            x=alt.X("country:N", sort='-y', title="Country"),
+            y=alt.Y("count:Q", title="Number of Recalls")
+        ).properties(height=350)
+        st.altair_chart(chart_country, use_container_width=True)
+
+@st.fragment
+def lazy_section(title: str, render, *args):
+    """Below-the-fold section: nothing is built or sent until the user switches it on, and the toggle reruns only this fragment."""
+    st.subheader(title)
+    if st.toggle(f"Show {title.split(' — ')[0].lower()}", key=f"show_{title}"):
+        render(*args)
 
 # ---------------------------
 # Remedy Types
 # ---------------------------
-st.subheader("Recalls by Remedy Type")
-with st.spinner("Loading remedies..."):
-    by_remedy = safe_get_json("/insights/by_remedy_type") or {}
-    if isinstance(by_remedy, dict):
-        df_remedy = pd.DataFrame(list(by_remedy.items()), columns=["remedy","count"])
-    elif isinstance(by_remedy, list):
-        df_remedy = pd.DataFrame(by_remedy)
-        if "name" in df_remedy.columns and "count" in df_remedy.columns:
-            df_remedy = df_remedy.rename(columns={"name":"remedy"})
-    else:
-        df_remedy = pd.DataFrame(columns=["remedy","count"])
-
-    if df_remedy.empty:
-        st.info("No remedy data available.")
-    else:
-        st.altair_chart(
-            alt.Chart(df_remedy.sort_values("count", ascending=False).head(12)).mark_bar().encode(
-                x=alt.X("count:Q", title="Number of Recalls"),
-                y=alt.Y("remedy:N", sort='-x', title="Remedy Type")
-            ).properties(height=320),
-            use_container_width=True
-        )
+def render_remedy(future: Future):
+    with st.spinner("Loading remedies..."):
+        by_remedy = await_json(future) or {}
+        df_remedy = to_kv_df(by_remedy, "remedy")
+
+        if df_remedy.empty:
+            st.info("No remedy data available.")
+        else:
+            st.altair_chart(
+                alt.Chart(chart_data(df_remedy, "remedy", top_n=12)).mark_bar().encode(
+                    x=alt.X("count:Q", title="Number of Recalls"),
+                    y=alt.Y("remedy:N", sort='-x', title="Remedy Type")
+                ).properties(height=320),
+                use_container_width=True
+            )
+
+lazy_section("Recalls by Remedy Type", render_remedy, pending["by_remedy_type"])
 
 # ---------------------------
 # Hazards Top
 # ---------------------------
-st.subheader("Top Hazards / Hazard Descriptions")
-with st.spinner("Loading hazards..."):
-    by_hazard = safe_get_json("/insights/by_hazard") or {}
-    if isinstance(by_hazard, dict):
-        df_hazard = pd.DataFrame(list(by_hazard.items()), columns=["hazard","count"])
-    elif isinstance(by_hazard, list):
-        df_hazard = pd.DataFrame(by_hazard)
-        if "name" in df_hazard.columns and "count" in df_hazard.columns:
-            df_hazard = df_hazard.rename(columns={"name":"hazard"})
-    else:
-        df_hazard = pd.DataFrame(columns=["hazard","count"])
-
-    if df_hazard.empty:
-        st.info("No hazard data available.")
-    else:
-        st.altair_chart(
-            alt.Chart(df_hazard.sort_values("count", ascending=False).head(12)).mark_bar().encode(
-                x=alt.X("count:Q", title="Number of Recalls"),
-                y=alt.Y("hazard:N", sort='-x', title="Hazard")
-            ).properties(height=320),
-            use_container_width=True
-        )
+def render_hazard(future: Future):
+    with st.spinner("Loading hazards..."):
+        by_hazard = await_json(future) or {}
+        df_hazard = to_kv_df(by_hazard, "hazard")
+
+        if df_hazard.empty:
+            st.info("No hazard data available.")
+        else:
+            st.altair_chart(
+                alt.Chart(chart_data(df_hazard, "hazard", top_n=12)).mark_bar().encode(
+                    x=alt.X("count:Q", title="Number of Recalls"),
+                    y=alt.Y("hazard:N", sort='-x', title="Hazard")
+                ).properties(height=320),
+                use_container_width=True
+            )
+
+lazy_section("Top Hazards / Hazard Descriptions", render_hazard, pending["by_hazard"])
 
 # ---------------------------
 # Latest Recalls Table with Filters
 # ---------------------------
-st.subheader("Latest Recalls (filterable)")
-params = {"page": 1, "page_size": 200, "manufacturer": manufacturer_filter, "country": country_filter, "source": source_filter}
-
-with st.spinner("Fetching latest recalls..."):
-    latest = safe_get_json("/recalls/", params=params) or []
-    if isinstance(latest, dict) and "detail" in latest:
-        st.error(latest.get("detail"))
-        latest = []
-    df_latest = pd.DataFrame(latest)
-
-if df_latest.empty:
-    st.info("No recalls to show.")
-else:
+@st.fragment
+def latest_recalls_section():
+    """Filters + table; editing a filter reruns only this fragment, not the insights above."""
+    st.subheader("Latest Recalls (filterable)")
+    f1, f2, f3 = st.columns(3)
+    manufacturer_filter = f1.text_input("Manufacturer (partial)")
+    country_filter = f2.text_input("Country (partial, ex: USA)")
+    source_filter = f3.text_input("Source (partial, ex: recall/warning)")
+    params = {"page": 1, "page_size": 200, "manufacturer": manufacturer_filter, "country": country_filter, "source": source_filter}
+
+    with st.spinner("Fetching latest recalls..."):
+        latest, error = fetch_json("/recalls/", params)
+        if error:
+            st.error(error)
+        latest = latest or []
+        if isinstance(latest, dict) and "detail" in latest:
+            st.error(latest.get("detail"))
+            latest = []
+        df_latest = pd.DataFrame(latest)
+
+    if df_latest.empty:
+        st.info("No recalls to show.")
+        return
     # normalize date column to readable
     if "recall_date" in df_latest.columns:
-        df_latest["recall_date_readable"] = df_latest["recall_date"].apply(to_readable_date)
+        df_latest["recall_date_readable"] = to_readable_dates(df_latest["recall_date"])
     # ensure manufacturers and sold_at are lists
     for col in ["manufacturers", "sold_at"]:
         if col in df_latest.columns:
-            df_latest[col] = df_latest[col].apply(lambda x: ", ".join(x) if isinstance(x, list) else (x or ""))
+            df_latest[col] = join_lists(df_latest[col])
 
     show_cols = ["recall_number", "product_safety_warning_number", "name_of_product", "recall_date_readable", "source", "units", "manufacturers", "sold_at"]
     available = [c for c in show_cols if c in df_latest.columns]
     st.dataframe(df_latest[available].rename(columns={"recall_date_readable":"recall_date"}))
 
+latest_recalls_section()
+
 # ---------------------------
 # Map (approximate)
 # ---------------------------
-st.subheader("Geographic (approximate) — Recalls by Country")
 # Small static mapping for demo (should use geocoding in production)
 country_coords = {
     "United States": [37.0902, -95.7129],
@@ -327,29 +414,33 @@ country_coords = {
     "CAN": [56.1304, -106.3468],
     "Mexico": [23.6345, -102.5528],
 }
-
-if not df_country.empty:
-    df_map = df_country.copy()
-    df_map["lat"] = df_map["country"].map(lambda x: country_coords.get(x, [0,0])[0])
-    df_map["lon"] = df_map["country"].map(lambda x: country_coords.get(x, [0,0])[1])
-    df_map = df_map[df_map["lat"] != 0]  # only show known coords for clarity
-
-    if not df_map.empty:
-        st.pydeck_chart(pdk.Deck(
-            map_style="mapbox://styles/mapbox/light-v9",
-            initial_view_state=pdk.ViewState(latitude=37.0, longitude=-95.0, zoom=2),
-            layers=[
-                pdk.Layer(
-                    "ScatterplotLayer",
-                    data=df_map,
-                    get_position='[lon, lat]',
-                    get_radius="count * 5000",
-                    get_fill_color='[200, 30, 0, 180]',
-                    pickable=True
-                )
-            ],
-        ))
-
+country_lat = {k: v[0] for k, v in country_coords.items()}
+country_lon = {k: v[1] for k, v in country_coords.items()}
+
+def render_map(df_country: pd.DataFrame):
+    if not df_country.empty:
+        df_map = df_country.copy()
+        df_map["lat"] = df_map["country"].map(country_lat)
+        df_map["lon"] = df_map["country"].map(country_lon)
+        df_map = df_map.dropna(subset=["lat"])  # only show known coords for clarity
+
+        if not df_map.empty:
+            st.pydeck_chart(pdk.Deck(
+                map_style="mapbox://styles/mapbox/light-v9",
+                initial_view_state=pdk.ViewState(latitude=37.0, longitude=-95.0, zoom=2),
+                layers=[
+                    pdk.Layer(
+                        "ScatterplotLayer",
+                        data=df_map,
+                        get_position='[lon, lat]',
+                        get_radius="count * 5000",
+                        get_fill_color='[200, 30, 0, 180]',
+                        pickable=True
+                    )
+                ],
+            ))
+
+lazy_section("Geographic (approximate) — Recalls by Country", render_map, df_country)
 st.caption("Note: Country geolocation is approximate and for demo purposes only. For production use, use a dedicated geo dataset or geocoding service.")
 
 # ---------------------------
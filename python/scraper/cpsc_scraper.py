@@ -1,16 +1,13 @@
 import os
+import argparse
 import time
-import csv
 import json
 import re
-from datetime import datetime
-import schedule
-from selenium.webdriver.chrome.service import Service
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import itertools
+from datetime import datetime, time as dt_time, timedelta
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import requests
 import iris
 import pandas as pd
 
@@ -36,8 +33,18 @@ class IRIS_connection:
         df = self.query(q, [table_name.upper()])
         return not df.empty and int(df.iloc[0, 0]) > 0
 
-    def create_table(self, table_name: str, columns: dict):
-        if self.table_exists(table_name):
+    def existing_tables(self, table_names: list) -> set:
+        """Nomes (em maiúsculas) das tabelas de `table_names` que já existem, numa única consulta."""
+        names = [t.upper() for t in table_names]
+        placeholders = ', '.join(['?'] * len(names))
+        q = f"SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME IN ({placeholders})"
+        df = self.query(q, names)
+        return set(df.iloc[:, 0].str.upper()) if not df.empty else set()
+
+    def create_table(self, table_name: str, columns: dict, existing: set = None):
+        """Cria a tabela se não existir; `existing` (de existing_tables) evita a consulta por tabela."""
+        exists = table_name.upper() in existing if existing is not None else self.table_exists(table_name)
+        if exists:
             return
         cursor = self.conn.cursor()
         cols = ", ".join([f"{k} {v}" for k, v in columns.items()])
@@ -47,11 +54,63 @@ class IRIS_connection:
         cursor.close()
         print(f"[OK] Table {table_name} created.")
 
-    def insert(self, table_name: str, data: dict) -> None:
+    def index_exists(self, table_name: str, index_name: str) -> bool:
+        q = "SELECT COUNT(*) FROM INFORMATION_SCHEMA.INDEXES WHERE TABLE_NAME=? AND INDEX_NAME=?"
+        df = self.query(q, [table_name.upper(), index_name.upper()])
+        return not df.empty and int(df.iloc[0, 0]) > 0
+
+    def existing_indexes(self, table_names: list) -> set:
+        """Pares (TABELA, ÍNDICE), em maiúsculas, dos índices já existentes em `table_names`, numa única consulta."""
+        names = [t.upper() for t in table_names]
+        placeholders = ', '.join(['?'] * len(names))
+        q = f"SELECT TABLE_NAME, INDEX_NAME FROM INFORMATION_SCHEMA.INDEXES WHERE TABLE_NAME IN ({placeholders})"
+        df = self.query(q, names)
+        return {(t.upper(), i.upper()) for t, i in df.itertuples(index=False)} if not df.empty else set()
+
+    def create_index(self, table_name: str, index_name: str, columns: list, unique: bool = False, existing: set = None):
+        """Cria o índice se não existir; `existing` (de existing_indexes) evita a consulta por índice."""
+        if existing is not None:
+            exists = (table_name.upper(), index_name.upper()) in existing
+        else:
+            exists = self.index_exists(table_name, index_name)
+        if exists:
+            return
+        cursor = self.conn.cursor()
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        try:
+            cursor.execute(f"CREATE {kind} {index_name} ON {table_name} ({', '.join(columns)})")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        print(f"[OK] Index {index_name} created.")
+
+    def delete_duplicates(self, table_name: str, key_column: str) -> None:
+        """Mantém só a linha de maior id para cada valor não nulo de `key_column`."""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f"DELETE FROM {table_name} WHERE {key_column} IS NOT NULL AND id NOT IN "
+                f"(SELECT MAX(id) FROM {table_name} WHERE {key_column} IS NOT NULL GROUP BY {key_column})"
+            )
+            removed = cursor.rowcount
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+        if removed and removed > 0:
+            print(f"[OK] Removed {removed} duplicate rows from {table_name} by {key_column}.")
+
+    def insert(self, table_name: str, data: dict, upsert: bool = False) -> None:
         cursor = self.conn.cursor()
         columns = ', '.join([col.upper() for col in data.keys()])
         placeholders = ', '.join(['?'] * len(data))
-        sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+        verb = "INSERT OR UPDATE" if upsert else "INSERT"
+        sql = f"{verb} INTO {table_name} ({columns}) VALUES ({placeholders})"
         try:
             cursor.execute(sql, tuple(data.values()))
             self.conn.commit()
@@ -61,14 +120,62 @@ class IRIS_connection:
         finally:
             cursor.close()
 
+    def insert_many(self, table_name: str, rows: list, upsert: bool = False) -> None:
+        """Insere várias linhas com executemany e um único commit (uma instrução por conjunto de colunas).
+
+        Com `upsert=True` usa INSERT OR UPDATE: linhas que colidem em um índice único são atualizadas.
+        """
+        if not rows:
+            return
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+        verb = "INSERT OR UPDATE" if upsert else "INSERT"
+        cursor = self.conn.cursor()
+        try:
+            for keys, values in groups.items():
+                columns = ', '.join([col.upper() for col in keys])
+                placeholders = ', '.join(['?'] * len(keys))
+                sql = f"{verb} INTO {table_name} ({columns}) VALUES ({placeholders})"
+                cursor.executemany(sql, values)
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Batch insert into {table_name} failed ({e}), retrying row by row.")
+            for row in rows:
+                self.insert(table_name, row, upsert)
+        finally:
+            cursor.close()
+
 # === CONFIG ===
 BASE_URL = "https://www.cpsc.gov/Recalls"
+RECALLS_CSV_URL = f"{BASE_URL}/CSV/recalls_recall_listing.csv"
+WARNINGS_CSV_URL = f"{BASE_URL}/CSV/product_safety_warning_listing.csv"
+DOWNLOAD_TIMEOUT = 60
+RUN_AT = dt_time(22, 0)  # horário diário da importação
 DOWNLOAD_DIR = os.path.join(os.getcwd(), "downloads")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
 RECALLS_CSV = os.path.join(DOWNLOAD_DIR, "recalls_recall_listing.csv")
 WARNINGS_CSV = os.path.join(DOWNLOAD_DIR, "product_safety_warning_listing.csv")
 OUTPUT_JSON = "./processed_cpsc_data.json"
+HOROLOG_BASE = pd.Timestamp(1840, 12, 31)
+BATCH_SIZE = 500  # máximo de parâmetros por cláusula IN
+CHUNK_SIZE = 1000  # linhas do CSV processadas e gravadas por vez
+
+UNIQUE_KEYS = [
+    ("uq_cpsc_data_recall", "recall_number"),
+    ("uq_cpsc_data_warning", "product_safety_warning_number"),
+]
+
+AUX_FIELDS = [
+    ("sold_at", "cpsc_sold_at"),
+    ("importers", "cpsc_importers"),
+    ("manufacturers", "cpsc_manufacturers"),
+    ("distributors", "cpsc_distributors"),
+    ("manufactured_in", "cpsc_manufactured_in"),
+    ("remedy_type", "cpsc_remedy_type"),
+]
 
 KNOWN_BRANDS = {
     "amazon", "walmart", "target", "best buy", "home depot", "lowe", "costco",
@@ -76,32 +183,37 @@ KNOWN_BRANDS = {
     "nordstrom", "kohls", "toys r us", "staples", "officedepot", "apolloscooters"
 }
 
+COMPANY_STOPWORDS = frozenset({"China", "Ltd", "Inc", "LLC", "Corp", "Company", "Corporation", "Co", "USA"})
+
+# === REGEX (compiladas uma vez) ===
+_BRAND_RE = re.compile(r"\b(" + "|".join(re.escape(b) for b in KNOWN_BRANDS) + r")\b", re.I)
+_OF_FROM_RE = re.compile(r"\b(of|from)\s+[A-Z][a-z]+")
+_DBA_RE = re.compile(r"doing business as|dba|seller|trading as|also known as", re.I)
+_WS_RE = re.compile(r"\s{2,}")
+_COMPANY_TOKEN_RE = re.compile(r"\b[A-Z][A-Za-z0-9&\-\s]{2,}\b")
+_UNITS_RE = re.compile(r"([\d,]+)")
+_SITE_RE = re.compile(r"[A-Za-z0-9\.\-]+\.(?:com|org|co|net|gov)")
+_STORE_RE = re.compile(r"\b[A-Z][A-Za-z&\s]{2,}(?=\s+(?:stores|online|nationwide|and))")
+
 # === UTILS ===
-def to_horolog(date_str):
-    if not date_str or not date_str.strip():
-        return None
-    try:
-        dt = datetime.strptime(date_str.strip(), "%B %d, %Y")
-        base = datetime(1840, 12, 31)
-        return (dt - base).days
-    except Exception:
-        return None
+def to_nullable_int(values: pd.Series) -> pd.Series:
+    """Série numérica -> objetos int do Python, com None no lugar de NaN."""
+    values = values.astype("Int64").astype(object)
+    return values.where(values.notna(), None)
+
+def to_horolog(dates: pd.Series) -> pd.Series:
+    """Converte datas "%B %d, %Y" em dias desde 1840-12-31 (None quando inválidas)."""
+    parsed = pd.to_datetime(dates.astype("string").str.strip(), format="%B %d, %Y", errors="coerce")
+    return to_nullable_int((parsed - HOROLOG_BASE).dt.days)
 
 def parse_remedy(remedy_str):
     if not remedy_str:
         return []
     return [r.strip().upper() for r in remedy_str.split(",") if r.strip()]
 
-def extract_units(units_str):
-    if not units_str:
-        return None
-    match = re.search(r"([\d,]+)", units_str)
-    if match:
-        try:
-            return int(match.group(1).replace(",", ""))
-        except ValueError:
-            return None
-    return None
+def extract_units(units: pd.Series) -> pd.Series:
+    digits = units.astype("string").str.extract(_UNITS_RE, expand=False).str.replace(",", "", regex=False)
+    return to_nullable_int(pd.to_numeric(digits, errors="coerce"))
 
 def split_list_field(value):
     if not value:
@@ -112,132 +224,163 @@ def clean_company_list(values):
     if not values:
         return []
     text = " ".join(values)
-    text = re.sub(r"\b(of|from)\s+[A-Z][a-z]+", "", text)
-    text = re.sub(r"doing business as|dba|seller|trading as|also known as", "", text, flags=re.I)
-    text = re.sub(r"\s{2,}", " ", text).strip()
-    matches = re.findall(r"\b[A-Z][A-Za-z0-9&\-\s]{2,}\b", text)
-    cleaned = [m.strip() for m in matches if len(m.strip()) > 2]
-    found_known = []
-    for brand in KNOWN_BRANDS:
-        if re.search(rf"\b{brand}\b", text, re.I):
-            found_known.append(brand.title())
-    ignore = {"China", "Ltd", "Inc", "LLC", "Corp", "Company", "Corporation", "Co", "USA"}
+    text = _OF_FROM_RE.sub("", text)
+    text = _DBA_RE.sub("", text)
+    text = _WS_RE.sub(" ", text).strip()
+    found_known = {brand.lower().title() for brand in _BRAND_RE.findall(text)}
+    if found_known:
+        return sorted(found_known)
+    matches = (m.strip() for m in _COMPANY_TOKEN_RE.findall(text))
+    candidates = {m for m in matches if len(m) > 2 and m not in COMPANY_STOPWORDS}
+    # do menor para o maior: basta checar se algum nome já aceito está contido no atual
     unique = []
-    for c in cleaned:
-        if c not in ignore and not any(c in u or u in c for u in unique):
+    for c in sorted(candidates, key=lambda c: (len(c), c)):
+        if not any(u in c for u in unique):
             unique.append(c)
-    return sorted(set(found_known) if found_known else unique)
+    return sorted(unique)
 
 def normalize_sold_at(text):
     if not isinstance(text, str) or not text.strip():
         return []
     text_lower = text.lower()
-    sites = re.findall(r"[A-Za-z0-9\.\-]+\.(?:com|org|co|net|gov)", text)
+    sites = _SITE_RE.findall(text)
     brands = [b.title() for b in KNOWN_BRANDS if b in text_lower]
-    stores = re.findall(r"\b[A-Z][A-Za-z&\s]{2,}(?=\s+(?:stores|online|nationwide|and))", text)
+    stores = _STORE_RE.findall(text)
     all_items = list(set(sites + stores + brands))
     return sorted([s.strip() for s in all_items if s.strip()])
 
 # === CSV PROCESSING ===
-def process_csv(path, source_type):
-    data = []
-    with open(path, newline='', encoding="utf-8-sig") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            base = {
-                "name_of_product": row.get("Name of product"),
-                "description": row.get("Description"),
-                "hazard_description": row.get("Hazard Description"),
-                "consumer_action": row.get("Consumer Action"),
-                "units": extract_units(row.get("Units")),
-                "incidents": row.get("Incidents"),
-                "sold_at": normalize_sold_at(row.get("Sold At")),
-                "importers": clean_company_list(split_list_field(row.get("Importers"))),
-                "manufacturers": clean_company_list(split_list_field(row.get("Manufacturers"))),
-                "distributors": clean_company_list(split_list_field(row.get("Distributors"))),
-                "manufactured_in": split_list_field(row.get("Manufactured In")),
-            }
-            if source_type == "recall":
-                base.update({
-                    "source": "recall",
-                    "recall_number": row.get("Recall Number"),
-                    "recall_date": to_horolog(row.get("Date")),
-                    "recall_heading": row.get("Recall Heading"),
-                    "remedy_type": parse_remedy(row.get("Remedy Type")),
-                    "remedy": row.get("Remedy"),
-                })
-            else:
-                base.update({
-                    "source": "warning",
-                    "product_safety_warning_number": row.get("Product Safety Warning Number"),
-                    "recall_date": to_horolog(row.get("Product Safety Warning Date")),
-                    "recall_heading": row.get("Product Safety Warning Title"),
-                })
-            data.append(base)
-    return data
-
-# === SELENIUM CSV DOWNLOAD ===
+def iter_csv(path, source_type, chunksize=CHUNK_SIZE):
+    """Lê o CSV em blocos de `chunksize` linhas, gerando uma lista de registros por bloco."""
+    reader = pd.read_csv(path, dtype=str, keep_default_na=False, encoding="utf-8-sig", chunksize=chunksize)
+    with reader:
+        for df in reader:
+            yield process_frame(df, source_type)
+
+def iter_json(path, chunksize=CHUNK_SIZE):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    for i in range(0, len(data), chunksize):
+        yield data[i:i + chunksize]
+
+def tee_json(chunks, path):
+    """Repassa os blocos gravando-os em `path` como uma lista JSON; o arquivo só é substituído no final."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        separator = "\n"
+        for chunk in chunks:
+            for record in chunk:
+                f.write(separator)
+                json.dump(record, f, ensure_ascii=False)
+                separator = ",\n"
+            yield chunk
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+    print("[OK] Processing finished. JSON saved.")
+
+def process_frame(df, source_type):
+    df = df.astype(object).where(df.notna(), None)
+
+    def column(name):
+        # colunas ausentes no CSV viram None, como row.get() no DictReader
+        return df[name] if name in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    data = pd.DataFrame({
+        "name_of_product": column("Name of product"),
+        "description": column("Description"),
+        "hazard_description": column("Hazard Description"),
+        "consumer_action": column("Consumer Action"),
+        "units": extract_units(column("Units")),
+        "incidents": column("Incidents"),
+        "sold_at": column("Sold At").map(normalize_sold_at),
+        "importers": column("Importers").map(split_list_field).map(clean_company_list),
+        "manufacturers": column("Manufacturers").map(split_list_field).map(clean_company_list),
+        "distributors": column("Distributors").map(split_list_field).map(clean_company_list),
+        "manufactured_in": column("Manufactured In").map(split_list_field),
+    })
+    if source_type == "recall":
+        data["source"] = "recall"
+        data["recall_number"] = column("Recall Number")
+        data["recall_date"] = to_horolog(column("Date"))
+        data["recall_heading"] = column("Recall Heading")
+        data["remedy_type"] = column("Remedy Type").map(parse_remedy)
+        data["remedy"] = column("Remedy")
+    else:
+        data["source"] = "warning"
+        data["product_safety_warning_number"] = column("Product Safety Warning Number")
+        data["recall_date"] = to_horolog(column("Product Safety Warning Date"))
+        data["recall_heading"] = column("Product Safety Warning Title")
+    return data.to_dict("records")
+
+# === CSV DOWNLOAD ===
+def download_csv(url, path):
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True  # descomprime gzip/deflate no copyfileobj
+        with open(path, "wb") as f:
+            shutil.copyfileobj(r.raw, f)
+    print(f"[OK] Downloaded: {os.path.basename(path)}")
+
 def download_cpsc_csvs():
-    service = Service('/usr/bin/chromedriver')
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument("--disable-extensions")
-    chrome_options.add_argument("--start-maximized")
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    try:
-        driver.get(BASE_URL)
-        wait = WebDriverWait(driver, 20)
-        try:
-            close_btn = wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="sitewidePopup"]/div/div/div[3]/button')))
-            close_btn.click()
-            print("[OK] Popup closed.")
-            time.sleep(2)
-        except Exception:
-            pass
-        export_tab = wait.until(EC.element_to_be_clickable((By.XPATH, '//label[@for="tab2"]')))
-        export_tab.click()
-        print("[OK] 'Export CSV' tab opened.")
-        time.sleep(2)
-        recalls_csv = wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="recalls_csv"]/div/div/div[2]/a[2]')))
-        recalls_csv.click()
-        print("[OK] Downloading: Recalls CSV...")
-        time.sleep(5)
-        warnings_csv = wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="recalls_csv"]/div/div/div[2]/a[3]')))
-        warnings_csv.click()
-        print("[OK] Downloading: Product Safety Warnings CSV...")
-        time.sleep(5)
-    finally:
-        driver.quit()
+    """Baixa os dois CSVs de exportação da CPSC em paralelo, direto das URLs."""
+    downloads = [(RECALLS_CSV_URL, RECALLS_CSV), (WARNINGS_CSV_URL, WARNINGS_CSV)]
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        futures = [executor.submit(download_csv, url, path) for url, path in downloads]
+        for future in futures:
+            future.result()
 
 # === AUXILIARY TABLE UPSERT ===
-def upsert_aux_table(conn, table_name, key, values):
+def upsert_aux_table(conn, table_name, keys, rows):
+    """Substitui as linhas de `keys` em uma transação: DELETE ... IN em lotes e um executemany."""
     cursor = conn.conn.cursor()
-    cursor.execute(f"DELETE FROM {table_name} WHERE recall_number = ?", (key,))
-    conn.conn.commit()
-    cursor.close()
-    for v in values:
-        conn.insert(table_name, {"recall_number": key, "value": v})
+    try:
+        for i in range(0, len(keys), BATCH_SIZE):
+            batch = keys[i:i + BATCH_SIZE]
+            placeholders = ', '.join(['?'] * len(batch))
+            cursor.execute(f"DELETE FROM {table_name} WHERE recall_number IN ({placeholders})", batch)
+        if rows:
+            cursor.executemany(f"INSERT INTO {table_name} (RECALL_NUMBER, VALUE) VALUES (?, ?)", rows)
+        conn.conn.commit()
+    except Exception as e:
+        conn.conn.rollback()
+        print(f"Failed to update {table_name}: {e}")
+    finally:
+        cursor.close()
+
+# === PERSISTENCE ===
+def save_chunk(conn, records):
+    """Grava um bloco de registros em cpsc_data (INSERT OR UPDATE) e nas tabelas auxiliares."""
+    upserts = {}  # key -> colunas de cpsc_data (o último registro visto vence)
+    latest = {}  # key -> último registro visto, usado nas tabelas auxiliares
+    for record in records:
+        flat_data = {k: v for k, v in record.items() if not isinstance(v, list)}
+        key = flat_data.get("recall_number") or flat_data.get("product_safety_warning_number")
+        if not key:
+            continue
+        latest[key] = record
+        upserts[key] = flat_data
+
+    conn.insert_many("cpsc_data", list(upserts.values()), upsert=True)
+
+    keys = list(latest)
+    for list_field, table_name in AUX_FIELDS:
+        rows = [(key, v) for key, record in latest.items() for v in record.get(list_field, [])]
+        upsert_aux_table(conn, table_name, keys, rows)
 
 # === MAIN TASK ===
 def run_task():
     try:
         print("[INFO] Starting CSV capture from website...")
         download_cpsc_csvs()
-        recalls = process_csv(RECALLS_CSV, "recall")
-        warnings = process_csv(WARNINGS_CSV, "warning")
-        all_data = recalls + warnings
-        with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-            json.dump(all_data, f, ensure_ascii=False, indent=2)
-        print("[OK] Processing finished. JSON saved.")
+        chunks = tee_json(itertools.chain(iter_csv(RECALLS_CSV, "recall"), iter_csv(WARNINGS_CSV, "warning")), OUTPUT_JSON)
+        # processa o primeiro bloco já aqui para que um CSV inválido caia no backup
+        chunks = itertools.chain([next(chunks, [])], chunks)
     except Exception as e:
         print(f"[WARN] CSV capture failed: {e}")
         if os.path.exists(OUTPUT_JSON):
             print("[INFO] Using preprocessed JSON backup.")
-            with open(OUTPUT_JSON, "r", encoding="utf-8") as f:
-                all_data = json.load(f)
+            chunks = iter_json(OUTPUT_JSON)
         else:
             print("[ERROR] No backup JSON found. Aborting.")
             return
@@ -245,6 +388,17 @@ def run_task():
     conn = IRIS_connection()
 
     # === CREATE TABLES ===
+    aux_tables = {
+        "cpsc_sold_at": "VARCHAR(255)",
+        "cpsc_importers": "VARCHAR(255)",
+        "cpsc_manufacturers": "VARCHAR(255)",
+        "cpsc_distributors": "VARCHAR(255)",
+        "cpsc_manufactured_in": "VARCHAR(255)",
+        "cpsc_remedy_type": "VARCHAR(255)"
+    }
+    existing_tables = conn.existing_tables(["cpsc_data", *aux_tables])
+    existing_indexes = conn.existing_indexes(["cpsc_data", *aux_tables])
+
     conn.create_table("cpsc_data", {
         "id": "SERIAL PRIMARY KEY",
         "source": "VARCHAR(20)",
@@ -259,51 +413,35 @@ def run_task():
         "recall_date": "DATE",
         "recall_heading": "VARCHAR(8000)",
         "remedy": "VARCHAR(8000)"
-    })
+    }, existing_tables)
+    # índices únicos: são as chaves usadas pelo INSERT OR UPDATE de save_chunk. Bases antigas
+    # têm chaves repetidas (warnings eram reinseridos a cada execução), removidas antes de criá-los.
+    try:
+        for index_name, key_column in UNIQUE_KEYS:
+            if ("CPSC_DATA", index_name.upper()) not in existing_indexes:
+                conn.delete_duplicates("cpsc_data", key_column)
+            conn.create_index("cpsc_data", index_name, [key_column], unique=True, existing=existing_indexes)
+    except Exception as e:
+        # sem chave única o INSERT OR UPDATE vira um INSERT simples e duplicaria as linhas
+        print(f"[ERROR] Could not create unique keys on cpsc_data: {e}. Aborting import.")
+        return
+    conn.create_index("cpsc_data", "idx_cpsc_data_recall_date", ["recall_date"], existing=existing_indexes)
+    conn.create_index("cpsc_data", "idx_cpsc_data_source", ["source"], existing=existing_indexes)
 
-    aux_tables = {
-        "cpsc_sold_at": "VARCHAR(255)",
-        "cpsc_importers": "VARCHAR(255)",
-        "cpsc_manufacturers": "VARCHAR(255)",
-        "cpsc_distributors": "VARCHAR(255)",
-        "cpsc_manufactured_in": "VARCHAR(255)",
-        "cpsc_remedy_type": "VARCHAR(255)"
-    }
     for tname, col_type in aux_tables.items():
         conn.create_table(tname, {
             "id": "SERIAL PRIMARY KEY",
             "recall_number": "VARCHAR(50)",
             "value": col_type
-        })
+        }, existing_tables)
+        conn.create_index(tname, f"idx_{tname}_recall", ["recall_number"], existing=existing_indexes)
 
-    for record in all_data:
-        flat_data = {k: v for k, v in record.items() if not isinstance(v, list)}
-        key = flat_data.get("recall_number") or flat_data.get("product_safety_warning_number")
-        if not key:
-            continue
-        existing = conn.query("SELECT id FROM cpsc_data WHERE recall_number=?", [key])
-        try:
-            if not existing.empty:
-                set_sql = ", ".join([f"{k.upper()}=?" for k in flat_data.keys()])
-                update_sql = f"UPDATE cpsc_data SET {set_sql} WHERE recall_number=?"
-                cursor = conn.conn.cursor()
-                cursor.execute(update_sql, tuple(flat_data.values()) + (key,))
-                conn.conn.commit()
-                cursor.close()
-            else:
-                conn.insert("cpsc_data", flat_data)
-        except Exception as e:
-            print(f"Error inserting/updating record: {e}")
-
-        for list_field, table_name in [
-            ("sold_at", "cpsc_sold_at"),
-            ("importers", "cpsc_importers"),
-            ("manufacturers", "cpsc_manufacturers"),
-            ("distributors", "cpsc_distributors"),
-            ("manufactured_in", "cpsc_manufactured_in"),
-            ("remedy_type", "cpsc_remedy_type"),
-        ]:
-            upsert_aux_table(conn, table_name, key, record.get(list_field, []))
+    try:
+        for chunk in chunks:
+            save_chunk(conn, chunk)
+    except Exception as e:
+        print(f"[ERROR] Import interrupted: {e}")
+        return
 
     # delete CSVs
     for f in [RECALLS_CSV, WARNINGS_CSV]:
@@ -311,13 +449,30 @@ def run_task():
             os.remove(f)
     print("[OK] Data saved successfully.")
 
-# === EXECUTE IMMEDIATELY ===
-run_task()
+# === SCHEDULING ===
+def seconds_until_next_run(now=None):
+    """Segundos até o próximo RUN_AT (hoje, ou amanhã se o horário já passou)."""
+    now = now or datetime.now()
+    next_run = now.replace(hour=RUN_AT.hour, minute=RUN_AT.minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def main():
+    parser = argparse.ArgumentParser(description="CPSC recalls/warnings scraper")
+    parser.add_argument("--once", action="store_true", help="run a single import and exit (for cron/systemd timers)")
+    args = parser.parse_args()
+
+    # === EXECUTE IMMEDIATELY ===
+    run_task()
+    if args.once:
+        return
 
-# === SCHEDULE DAILY AT 22:00 ===
-schedule.every().day.at("22:00").do(run_task)
-print("Scheduler started. Script will run daily at 22:00.")
+    # === SCHEDULE DAILY AT 22:00 ===
+    print(f"Scheduler started. Script will run daily at {RUN_AT:%H:%M}.")
+    while True:
+        time.sleep(seconds_until_next_run())
+        run_task()
 
-while True:
-    schedule.run_pending()
-    time.sleep(60)
+if __name__ == "__main__":
+    main()